@@ -1,14 +1,18 @@
 import os
+import re
+from datetime import datetime, timezone
 from fastapi import (
     APIRouter,
     UploadFile,
     File,
     Form,
     HTTPException,
-    Depends
+    Depends,
+    Header,
+    Query
 )
-from fastapi.responses import JSONResponse
-from typing import List
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
+from typing import List, Optional
 from sqlalchemy.orm import Session
 import requests  # ✅ For Facebook API call
 from pydantic import BaseModel  # ✅ For request validation
@@ -19,10 +23,18 @@ from app.core.security import AdminUser, pwd_context
 from app.api.endpoints.auth import get_current_user
 from app.utils.fb_data import save_fb_data
 from app.utils.fb_data import load_fb_data
+from app.services.image_handler import OVERLAY_MODES
+from app.core.admission import controller as admission_controller
+from app.core.profiling import list_profiles, profile_path
+from app.services.zip_export import ZipStream
+from app.utils.post_queue import load_queue
+from app.utils import phash_index
 
 
 SETTINGS_DIR = "app/static"
 UPLOADS_DIR = os.path.join(SETTINGS_DIR, "uploads")
+CAPTURED_DIR = os.path.join(SETTINGS_DIR, "captured_images")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif")
 os.makedirs(UPLOADS_DIR, exist_ok=True)
 
 router = APIRouter()
@@ -291,11 +303,24 @@ def update_settings(
     max_photos: int = Form(...),
     post_interval_minutes: int = Form(...),
     page_title: str = Form(...),
+    overlay_mode: Optional[str] = Form(None),
+    dedupe_enabled: Optional[bool] = Form(None),
+    dedupe_threshold: Optional[int] = Form(None),
+    dedupe_window_seconds: Optional[int] = Form(None),
     user: str = Depends(get_current_user)
 ):
     if not (15 <= max_photos <= 99):
         raise HTTPException(status_code=400, detail="max_photos must be between 15 and 99")
 
+    if overlay_mode is not None and overlay_mode not in ("",) + OVERLAY_MODES:
+        raise HTTPException(status_code=400, detail="overlay_mode must be empty, 'logo' or 'frame'")
+
+    if dedupe_threshold is not None and not (0 <= dedupe_threshold <= 64):
+        raise HTTPException(status_code=400, detail="dedupe_threshold must be between 0 and 64")
+
+    if dedupe_window_seconds is not None and dedupe_window_seconds < 0:
+        raise HTTPException(status_code=400, detail="dedupe_window_seconds must not be negative")
+
     settings = {
         "business_name": business_name,
         "business_address": business_address,
@@ -305,6 +330,14 @@ def update_settings(
         "post_interval_minutes": post_interval_minutes,
         "page_title": page_title
     }
+    if overlay_mode is not None:
+        settings["overlay_mode"] = overlay_mode
+    if dedupe_enabled is not None:
+        settings["dedupe_enabled"] = dedupe_enabled
+    if dedupe_threshold is not None:
+        settings["dedupe_threshold"] = dedupe_threshold
+    if dedupe_window_seconds is not None:
+        settings["dedupe_window_seconds"] = dedupe_window_seconds
 
     current = load_settings()
     current.update(settings)
@@ -348,6 +381,25 @@ async def upload_background(
 
     return {"message": "Background uploaded", "url": current["background_filename"]}
 
+# --- Upload Frame (🔒) ---
+# Transparent PNG burned over every posted photo when overlay_mode is "frame"
+@router.post("/upload/frame")
+async def upload_frame(
+    file: UploadFile = File(...),
+    user: str = Depends(get_current_user)
+):
+    filename = "frame_" + file.filename
+    path = os.path.join(UPLOADS_DIR, filename)
+
+    with open(path, "wb") as f:
+        f.write(await file.read())
+
+    current = load_settings()
+    current["frame_filename"] = f"/static/uploads/{filename}"
+    save_settings(current)
+
+    return {"message": "Frame uploaded", "url": current["frame_filename"]}
+
 # --- Facebook Page Connection (🔒) ---
 
 class FacebookPageCredentials(BaseModel):
@@ -412,4 +464,121 @@ def get_facebook_page_url():
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Facebook configuration not found")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error retrieving Facebook page URL: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error retrieving Facebook page URL: {str(e)}")
+
+# --- Capture admission stats (🔒) ---
+# Admitted/rejected counters and current load, used to tune the upload limits
+@router.get("/admission-stats")
+def get_admission_stats(user: str = Depends(get_current_user)):
+    return admission_controller.stats()
+
+# --- Profiles (🔒) ---
+# Saved when the server runs with PROFILING_ENABLED; open with pstats or snakeviz
+@router.get("/profiles")
+def get_profiles(user: str = Depends(get_current_user)):
+    return {"profiles": list_profiles()}
+
+@router.get("/profiles/{name}")
+def download_profile(name: str, user: str = Depends(get_current_user)):
+    path = profile_path(name)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
+
+# --- Export event photos as a ZIP (🔒) ---
+
+def _parse_export_time(value: str, name: str) -> float:
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}, use ISO 8601")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)  # Capture times are stored in UTC
+    return parsed.timestamp()
+
+def _post_status(name: str, queued: set, index: dict) -> str:
+    if name in queued:
+        return "queued"
+    entry = index.get(name)
+    if entry is None:
+        return "posted"  # Captured before the index existed, left the queue by being posted
+    if entry.get("posted"):
+        return "posted"
+    if entry.get("collapsed"):
+        return "collapsed"  # Near-duplicate of a posted frame, never posted itself
+    if entry.get("rejected"):
+        return "rejected"
+    return "dropped"  # Left the queue without being posted (e.g. went missing)
+
+def _select_export_photos(start: float, end: float, status: str):
+    if not os.path.exists(CAPTURED_DIR):
+        return []
+
+    queued = {item["filename"] for item in load_queue()} if status != "all" else set()
+    index = phash_index.all_entries() if status != "all" else {}
+    photos = []
+    for entry in os.scandir(CAPTURED_DIR):
+        if not entry.is_file() or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        if status != "all" and _post_status(entry.name, queued, index) != status:
+            continue
+        # mtime is the capture time (batch/resumable uploads keep the booth's clock)
+        mtime = entry.stat().st_mtime
+        if start is not None and mtime < start:
+            continue
+        if end is not None and mtime >= end:
+            continue
+        photos.append((mtime, entry.name))
+
+    photos.sort()
+    return [(name, os.path.join(CAPTURED_DIR, name)) for _, name in photos]
+
+@router.get("/export")
+def export_photos(
+    start: str = Query(None, description="Captured at or after (ISO 8601, UTC if no offset)"),
+    end: str = Query(None, description="Captured before (ISO 8601, UTC if no offset)"),
+    status: str = Query("all", pattern="^(all|queued|posted|collapsed|rejected)$"),
+    range_header: str = Header(None, alias="Range"),
+    if_range: str = Header(None, alias="If-Range"),
+    user: str = Depends(get_current_user)
+):
+    """
+    Streams a ZIP of the selected photos, built on the fly from disk.
+    Supports `Range` (with `If-Range` on the ETag) to resume downloads.
+    """
+    start_ts = _parse_export_time(start, "start") if start else None
+    end_ts = _parse_export_time(end, "end") if end else None
+
+    archive = ZipStream(_select_export_photos(start_ts, end_ts, status))
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": archive.etag,
+        "Content-Disposition": 'attachment; filename="event-photos.zip"'
+    }
+
+    # Only resume when the archive is byte-identical to the one being resumed
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip()) if range_header else None
+    if match and (if_range is None or if_range == archive.etag) and match.group(1) + match.group(2):
+        first, last = match.groups()
+        if first:
+            range_start = int(first)
+            range_end = min(int(last), archive.size - 1) if last else archive.size - 1
+        else:
+            # Suffix range: the last N bytes
+            range_start = max(archive.size - int(last), 0)
+            range_end = archive.size - 1
+
+        if range_start >= archive.size or range_start > range_end:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{archive.size}"})
+
+        headers["Content-Range"] = f"bytes {range_start}-{range_end}/{archive.size}"
+        headers["Content-Length"] = str(range_end - range_start + 1)
+        return StreamingResponse(
+            archive.iter_range(range_start, range_end),
+            status_code=206,
+            media_type="application/zip",
+            headers=headers
+        )
+
+    headers["Content-Length"] = str(archive.size)
+    return StreamingResponse(archive.iter_range(), media_type="application/zip", headers=headers)
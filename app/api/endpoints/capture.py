@@ -1,42 +1,150 @@
 import os
 import uuid
-from datetime import datetime
-from fastapi import APIRouter, File, UploadFile, HTTPException
+import shutil
+import struct
+import asyncio
+import logging
+import zipfile
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from fastapi import APIRouter, File, Form, Header, Request, UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 
+from app.core.admission import AdmissionRoute, booth_id, declared_photos, controller as admission_controller
+from app.core.config import MAX_BATCH_FILES, MAX_BATCH_BYTES, ADMISSION_MIN_FREE_MB, RESUMABLE_MAX_CHUNK_BYTES
+from app.services.image_handler import resolve_overlay, submit_composite
+from app.services import resumable_upload
+from app.services import photo_index
+from app.services.dedupe import submit_fingerprints
+from app.utils.post_queue import append_to_queue
+
 CAPTURED_DIR = "app/static/captured_images"
-POST_QUEUE_FILE = "app/static/queue.json"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif")
+ZIP_EXTENDED_TIMESTAMP = 0x5455  # "UT" extra field: UTC mtime as a Unix timestamp
+COPY_CHUNK_BYTES = 1024 * 1024
 
-router = APIRouter()
+# Every upload on this router goes through admission control first
+router = APIRouter(route_class=AdmissionRoute)
+logger = logging.getLogger(__name__)
 
 # Ensure necessary directories exist
 os.makedirs(CAPTURED_DIR, exist_ok=True)
 
+def queue_entry(filename: str, captured_at: datetime = None):
+    return {
+        "filename": filename,
+        "timestamp": (captured_at or datetime.utcnow()).isoformat()
+    }
+
 def save_to_post_queue(filename: str):
-    import json
+    entry = queue_entry(filename)
+    append_to_queue([entry])
+    return entry
 
-    if not os.path.exists(POST_QUEUE_FILE):
-        queue = []
-    else:
-        with open(POST_QUEUE_FILE, "r") as f:
-            queue = json.load(f)
+def unique_capture_name(original_name: str, captured_at: datetime = None) -> str:
+    ext = original_name.split(".")[-1]
+    stamp = (captured_at or datetime.utcnow()).strftime('%Y%m%d%H%M%S')
+    return f"{stamp}_{uuid.uuid4().hex}.{ext}"
 
-    queue.append({
-        "filename": filename,
-        "timestamp": datetime.utcnow().isoformat()
-    })
+# Blocking (settings and index file I/O): async routes call it through the threadpool
+def after_capture(entries, booth: str):
+    filenames = [entry["filename"] for entry in entries]
+
+    # Let slideshow delta polls see the new photos
+    photo_index.record_added(filenames)
+
+    # Hash now so near-duplicate bursts can be collapsed before posting
+    try:
+        submit_fingerprints(filenames, booth, {entry["filename"]: entry["timestamp"] for entry in entries})
+    except Exception:
+        logger.warning("Could not schedule fingerprinting", exc_info=True)
+
+    # Start branding photos now so they are ready by the time they are posted;
+    # the overlay is resolved once for the whole batch
+    overlay = resolve_overlay()
+    for name in filenames:
+        logger.info("Photo captured", extra={"photo": name})
+        if overlay is None:
+            continue
+        try:
+            submit_composite(name, overlay)
+        except Exception:
+            logger.warning("Could not schedule compositing", exc_info=True, extra={"photo": name})
 
-    with open(POST_QUEUE_FILE, "w") as f:
-        json.dump(queue, f, indent=4)
+def _parse_capture_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _parse_tz_offset(value: str) -> timedelta:
+    # "+02:00" / "-0530" / "Z"
+    return datetime.strptime(value.strip().replace("Z", "+00:00"), "%z").utcoffset()
+
+def _archive_capture_time(info: zipfile.ZipInfo, tz_offset: timedelta) -> datetime:
+    # Prefer the UTC mtime of the extended timestamp field when the zip tool wrote one
+    extra = info.extra
+    pos = 0
+    while pos + 4 <= len(extra):
+        tag, size = struct.unpack("<HH", extra[pos:pos + 4])
+        if tag == ZIP_EXTENDED_TIMESTAMP and size >= 5 and extra[pos + 4] & 1:
+            (mtime,) = struct.unpack("<i", extra[pos + 5:pos + 9])
+            return datetime.utcfromtimestamp(mtime)
+        pos += 4 + size
+    # Plain zip dates are the booth's local wall-clock time
+    return datetime(*info.date_time) - tz_offset
+
+def _keep_capture_time(file_path: str, captured_at: datetime):
+    # Slideshow orders by mtime, so keep the booth's capture time
+    ts = captured_at.replace(tzinfo=timezone.utc).timestamp()
+    os.utime(file_path, (ts, ts))
+
+def _copy_limited(source, dest, max_bytes: int):
+    written = 0
+    while True:
+        chunk = source.read(COPY_CHUNK_BYTES)
+        if not chunk:
+            return
+        written += len(chunk)
+        if written > max_bytes:
+            raise ValueError("Archive member is larger than its declared size")
+        dest.write(chunk)
+
+def _write_capture(source, unique_name: str, captured_at: datetime, max_bytes: int = None):
+    file_path = os.path.join(CAPTURED_DIR, unique_name)
+    try:
+        with open(file_path, "wb") as f:
+            if max_bytes is None:
+                shutil.copyfileobj(source, f)
+            else:
+                _copy_limited(source, f, max_bytes)
+    except Exception:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    _keep_capture_time(file_path, captured_at)
+
+def _write_archive_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, unique_name: str, captured_at: datetime):
+    # Never trust the archive: stop at the size its directory declared
+    with archive.open(info) as source:
+        _write_capture(source, unique_name, captured_at, max_bytes=info.file_size)
+
+def _check_archive_size(members):
+    total = sum(info.file_size for info in members)
+    if total > MAX_BATCH_BYTES:
+        raise HTTPException(status_code=413, detail=f"Archive expands to more than {MAX_BATCH_BYTES} bytes")
+    available = shutil.disk_usage(CAPTURED_DIR).free - ADMISSION_MIN_FREE_MB * 1024 * 1024
+    if total > available:
+        raise HTTPException(status_code=507, detail="Not enough storage for this archive")
 
 @router.post("/upload")
-async def upload_photo(file: UploadFile = File(...)):
+async def upload_photo(request: Request, file: UploadFile = File(...)):
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Invalid file type")
 
     # Unique filename generation
-    ext = file.filename.split(".")[-1]
-    unique_name = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex}.{ext}"
+    unique_name = unique_capture_name(file.filename)
     file_path = os.path.join(CAPTURED_DIR, unique_name)
 
     try:
@@ -44,9 +152,231 @@ async def upload_photo(file: UploadFile = File(...)):
         with open(file_path, "wb") as f:
             f.write(contents)
 
-        save_to_post_queue(unique_name)
+        entry = await run_in_threadpool(save_to_post_queue, unique_name)
+        await run_in_threadpool(after_capture, [entry], booth_id(request))
 
         return JSONResponse(content={"message": "Photo uploaded", "filename": unique_name}, status_code=201)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving photo: {str(e)}")
+
+# --- Batch upload for booths flushing an offline backlog ---
+# Either many `files` (with optional `timestamps`, one ISO 8601 capture time
+# per file) or one zip `archive` whose entry dates are used as capture times.
+# Zip dates without a UTC extended timestamp are local time: send the booth's
+# `tz_offset` (e.g. "+02:00"), otherwise they are taken as UTC.
+# Admission charges one token per photo: send X-Photo-Count so a batch the
+# booth cannot afford is refused before it is uploaded.
+@router.post("/upload/batch")
+async def upload_batch(
+    request: Request,
+    files: List[UploadFile] = File(None),
+    timestamps: List[str] = Form(None),
+    archive: UploadFile = File(None),
+    tz_offset: Optional[str] = Form(None),
+):
+    if not files and archive is None:
+        raise HTTPException(status_code=400, detail="Send files or an archive")
+    try:
+        archive_offset = _parse_tz_offset(tz_offset) if tz_offset else timedelta(0)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid tz_offset")
+
+    results = []
+    jobs = []  # (result, unique_name, captured_at, writer)
+    opened_archive = None
+
+    try:
+        if files:
+            if len(files) > MAX_BATCH_FILES:
+                raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_FILES} files per batch")
+            if timestamps and len(timestamps) != len(files):
+                raise HTTPException(status_code=400, detail="timestamps must match the number of files")
+
+            for index, file in enumerate(files):
+                result = {"file": file.filename}
+                results.append(result)
+
+                if not (file.content_type or "").startswith("image/"):
+                    result.update(status="error", detail="Invalid file type")
+                    continue
+                try:
+                    captured_at = _parse_capture_time(timestamps[index]) if timestamps else datetime.utcnow()
+                except ValueError:
+                    result.update(status="error", detail="Invalid timestamp")
+                    continue
+
+                unique_name = unique_capture_name(file.filename, captured_at)
+                jobs.append((result, unique_name, captured_at,
+                             lambda f=file, n=unique_name, t=captured_at: _write_capture(f.file, n, t)))
+
+        if archive is not None:
+            try:
+                opened_archive = zipfile.ZipFile(archive.file)
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail="Archive is not a valid zip file")
+
+            members = [
+                info for info in opened_archive.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+            ]
+            if len(results) + len(members) > MAX_BATCH_FILES:
+                raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_FILES} files per batch")
+            _check_archive_size(members)
+
+            for info in members:
+                result = {"file": info.filename}
+                results.append(result)
+                captured_at = _archive_capture_time(info, archive_offset)
+                unique_name = unique_capture_name(os.path.basename(info.filename), captured_at)
+                jobs.append((result, unique_name, captured_at,
+                             lambda i=info, n=unique_name, t=captured_at: _write_archive_member(opened_archive, i, n, t)))
+
+        # Charge for photos beyond the X-Photo-Count admission already paid for
+        admission_controller.admit_more(booth_id(request), len(jobs), declared_photos(request))
+
+        # Write every photo in parallel on the threadpool
+        outcomes = await asyncio.gather(
+            *(run_in_threadpool(writer) for _, _, _, writer in jobs),
+            return_exceptions=True
+        )
+    finally:
+        if opened_archive is not None:
+            opened_archive.close()
+
+    saved = []
+    for (result, unique_name, captured_at, _), outcome in zip(jobs, outcomes):
+        if isinstance(outcome, Exception):
+            result.update(status="error", detail=f"Error saving photo: {str(outcome)}")
+            continue
+        result.update(status="queued", filename=unique_name)
+        saved.append((captured_at, unique_name))
+
+    # One queue write for the whole batch, oldest capture first
+    saved.sort()
+    entries = [queue_entry(name, captured_at) for captured_at, name in saved]
+    await run_in_threadpool(append_to_queue, entries)
+    await run_in_threadpool(after_capture, entries, booth_id(request))
+
+    status_code = 201 if len(saved) == len(results) else 207
+    return JSONResponse(
+        content={"message": f"{len(saved)} of {len(results)} photos queued", "results": results},
+        status_code=status_code
+    )
+
+# --- Resumable uploads for unreliable venue networks ---
+# create -> append chunks at an offset (query the offset after a drop) ->
+# finalize, which hands the file to the regular capture + queue flow.
+
+@router.post("/uploads")
+def create_resumable_upload(
+    filename: str = Form(...),
+    content_type: str = Form(...),
+    size: Optional[int] = Form(None),
+    captured_at: Optional[str] = Form(None),
+):
+    if not content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="Invalid file type")
+    if size is not None and size <= 0:
+        raise HTTPException(status_code=400, detail="size must be positive")
+    if captured_at:
+        try:
+            _parse_capture_time(captured_at)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid captured_at")
+
+    upload_id = resumable_upload.create_upload(filename, content_type, size, captured_at)
+    return JSONResponse(
+        content={"upload_id": upload_id, "offset": 0},
+        status_code=201,
+        headers={"Upload-Offset": "0"}
+    )
+
+@router.api_route("/uploads/{upload_id}", methods=["GET", "HEAD"])
+def get_resumable_upload(upload_id: str):
+    try:
+        meta = resumable_upload.get_upload(upload_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+
+    return JSONResponse(
+        content={"upload_id": upload_id, "offset": meta["offset"], "size": meta["size"]},
+        headers={"Upload-Offset": str(meta["offset"])}
+    )
+
+@router.patch("/uploads/{upload_id}")
+async def append_resumable_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+):
+    content_length = request.headers.get("content-length")
+    if content_length and int(content_length) > RESUMABLE_MAX_CHUNK_BYTES:
+        raise HTTPException(status_code=413, detail=f"Chunks are limited to {RESUMABLE_MAX_CHUNK_BYTES} bytes")
+
+    # Stream so a body without Content-Length is never buffered past the limit
+    parts = []
+    received = 0
+    async for part in request.stream():
+        received += len(part)
+        if received > RESUMABLE_MAX_CHUNK_BYTES:
+            raise HTTPException(status_code=413, detail=f"Chunks are limited to {RESUMABLE_MAX_CHUNK_BYTES} bytes")
+        parts.append(part)
+    chunk = b"".join(parts)
+
+    try:
+        offset = await run_in_threadpool(resumable_upload.append_chunk, upload_id, upload_offset, chunk)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    except resumable_upload.OffsetMismatch as e:
+        # Client resumes from the offset we actually have
+        return JSONResponse(
+            content={"detail": "Offset mismatch", "offset": e.offset},
+            status_code=409,
+            headers={"Upload-Offset": str(e.offset)}
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return JSONResponse(content={"offset": offset}, headers={"Upload-Offset": str(offset)})
+
+@router.post("/uploads/{upload_id}/finalize")
+def finalize_resumable_upload(upload_id: str, request: Request):
+    try:
+        meta = resumable_upload.get_upload(upload_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    if meta["offset"] == 0:
+        raise HTTPException(status_code=400, detail="Upload is empty")
+
+    captured_at = _parse_capture_time(meta["captured_at"]) if meta["captured_at"] else None
+    unique_name = unique_capture_name(meta["filename"], captured_at)
+    file_path = os.path.join(CAPTURED_DIR, unique_name)
+
+    try:
+        resumable_upload.finalize_upload(upload_id, file_path)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    except resumable_upload.OffsetMismatch as e:
+        return JSONResponse(
+            content={"detail": "Upload incomplete", "offset": e.offset, "size": meta["size"]},
+            status_code=409,
+            headers={"Upload-Offset": str(e.offset)}
+        )
+
+    if captured_at:
+        _keep_capture_time(file_path, captured_at)
+
+    entry = queue_entry(unique_name, captured_at)
+    append_to_queue([entry])
+    after_capture([entry], booth_id(request))
+
+    return JSONResponse(content={"message": "Photo uploaded", "filename": unique_name}, status_code=201)
+
+@router.delete("/uploads/{upload_id}")
+def abort_resumable_upload(upload_id: str):
+    try:
+        resumable_upload.discard_upload(upload_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    return {"message": "Upload discarded"}
@@ -1,11 +1,48 @@
 import os
+import json
+import hashlib
+from typing import Optional
 from fastapi import APIRouter
 from app.models.settings import load_settings
+from app.services import photo_index
 
 router = APIRouter()
 
 CAPTURED_DIR = "app/static/captured_images"
 BASE_IMAGE_URL = "/static/captured_images/"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif")
+
+def _timed_photos(filenames):
+    # (capture time, filename) newest first, skipping photos already pruned from disk
+    timed = []
+    for name in filenames:
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        try:
+            timed.append((os.path.getmtime(os.path.join(CAPTURED_DIR, name)), name))
+        except FileNotFoundError:
+            continue
+    timed.sort(reverse=True)
+    return timed
+
+def _list_photos(max_photos: int):
+    # Get all images, sort by newest first
+    return [name for _, name in _timed_photos(os.listdir(CAPTURED_DIR))[:max_photos]]
+
+def _photo_entries(timed):
+    return [{"url": BASE_IMAGE_URL + name, "captured_at": mtime} for mtime, name in timed]
+
+def _branding(settings: dict):
+    return {
+        "logo": settings.get("logo_filename", ""),
+        "title": settings.get("page_title", ""),
+        "background": settings.get("background_filename", ""),
+        "max_photos": settings.get("max_photos", 50)
+    }
+
+def _branding_version(branding: dict) -> str:
+    # Hash of what screens render, so unrelated settings writes (caption_index) don't count
+    return hashlib.sha1(json.dumps(branding, sort_keys=True).encode()).hexdigest()[:8]
 
 @router.get("/")
 def get_slideshow_photos():
@@ -19,14 +56,7 @@ def get_slideshow_photos():
             "title": settings.get("page_title", "")
         }
 
-    # Get all images, sort by newest first
-    files = [
-        f for f in os.listdir(CAPTURED_DIR)
-        if f.lower().endswith((".png", ".jpg", ".jpeg", ".gif"))
-    ]
-    files.sort(key=lambda x: os.path.getmtime(os.path.join(CAPTURED_DIR, x)), reverse=True)
-
-    photos = [BASE_IMAGE_URL + filename for filename in files[:max_photos]]
+    photos = [BASE_IMAGE_URL + filename for filename in _list_photos(max_photos)]
 
     return {
         "photos": photos,
@@ -34,3 +64,50 @@ def get_slideshow_photos():
         "title": settings.get("page_title", ""),
         "background": settings.get("background_filename", "")
     }
+
+# --- Delta polling for slideshow screens ---
+# Clients send back the cursor from their last response and receive only
+# photos added/removed since then. Photos come with their capture time
+# (epoch seconds, the same mtime the full listing sorts by): merge added
+# photos into the current list, drop removed URLs, sort by captured_at
+# newest first and trim to max_photos, which yields the same list as a
+# full snapshot. Branding is included only when it changed.
+# Missing, unknown or too-old cursors get a full snapshot with "full": true.
+@router.get("/changes")
+def get_slideshow_changes(cursor: Optional[str] = None):
+    settings = load_settings()
+    branding = _branding(settings)
+    branding_version = _branding_version(branding)
+
+    delta = None
+    cursor_branding = None
+    if cursor:
+        try:
+            generation, seq, cursor_branding = cursor.split("-")
+            if generation == photo_index.GENERATION:
+                delta = photo_index.changes_since(int(seq))
+        except ValueError:
+            delta = None
+
+    if delta is None:
+        # Take the sequence first: anything recorded while listing is resent as a harmless duplicate
+        seq = photo_index.current_seq()
+        timed = _timed_photos(os.listdir(CAPTURED_DIR)) if os.path.exists(CAPTURED_DIR) else []
+        return {
+            "full": True,
+            "cursor": f"{photo_index.GENERATION}-{seq}-{branding_version}",
+            "photos": _photo_entries(timed[:branding["max_photos"]]),
+            **branding
+        }
+
+    added, removed, seq = delta
+
+    response = {
+        "full": False,
+        "cursor": f"{photo_index.GENERATION}-{seq}-{branding_version}",
+        "added": _photo_entries(_timed_photos(added)),
+        "removed": [BASE_IMAGE_URL + filename for filename in removed]
+    }
+    if cursor_branding != branding_version:
+        response.update(branding)
+    return response
@@ -0,0 +1,201 @@
+import math
+import time
+import shutil
+import threading
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request
+from fastapi.routing import APIRoute
+
+from app.core.config import (
+    MAX_BATCH_FILES,
+    ADMISSION_BOOTH_RATE,
+    ADMISSION_BOOTH_BURST,
+    ADMISSION_MAX_INFLIGHT,
+    ADMISSION_MAX_QUEUE_DEPTH,
+    ADMISSION_MIN_FREE_MB
+)
+from app.utils.post_queue import queue_depth
+
+BOOTH_HEADER = "X-Booth-Id"
+# Batch uploads declare how many photos they carry so they can be charged
+# before the body is read; undeclared photos are charged once it is parsed
+PHOTO_COUNT_HEADER = "X-Photo-Count"
+BATCH_PATH_SUFFIX = "/upload/batch"
+CAPTURED_DIR = "app/static/captured_images"
+
+ADMITTED_METHODS = ("POST", "PATCH")
+MAX_TRACKED_BOOTHS = 1000
+
+# Retry-After (seconds) suggested for each overload condition
+RETRY_AFTER_INFLIGHT = 1
+RETRY_AFTER_QUEUE_FULL = 60
+RETRY_AFTER_DISK_FULL = 300
+
+
+def booth_id(request: Request) -> str:
+    """Booths identify themselves with X-Booth-Id; fall back to the client IP."""
+    booth = request.headers.get(BOOTH_HEADER)
+    if booth:
+        return booth
+    return request.client.host if request.client else "unknown"
+
+
+def declared_photos(request: Request) -> int:
+    """Photos a request is charged for up front: 0 for chunk appends and finalize."""
+    if request.method != "POST" or request.url.path.endswith("/finalize"):
+        return 0  # Belongs to a photo already admitted
+    if not request.url.path.endswith(BATCH_PATH_SUFFIX):
+        return 1
+    try:
+        count = int(request.headers.get(PHOTO_COUNT_HEADER, "1"))
+    except ValueError:
+        count = 1
+    return min(max(count, 1), MAX_BATCH_FILES)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self, cost: float = 1) -> float:
+        """
+        Takes `cost` tokens; returns 0 on success or seconds until they are
+        available. A cost above the capacity needs a full bucket and leaves
+        it in debt, so a large batch is paid off before the next upload.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        needed = min(cost, self.capacity)
+        if self.tokens >= needed:
+            self.tokens -= cost
+            return 0
+        return (needed - self.tokens) / self.rate
+
+
+class AdmissionController:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # booth -> TokenBucket, least recently used first
+        self.inflight = 0
+        self.peak_inflight = 0
+        self.admitted = 0
+        self.rejected = {"rate_limited": 0, "too_many_inflight": 0, "queue_full": 0, "disk_full": 0}
+
+    def _reject(self, reason: str, status_code: int, retry_after: float, detail: str):
+        self.rejected[reason] += 1
+        raise HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+    def _bucket(self, booth: str) -> TokenBucket:
+        bucket = self._buckets.get(booth)
+        if bucket is not None:
+            self._buckets.move_to_end(booth)
+            return bucket
+        while len(self._buckets) >= MAX_TRACKED_BOOTHS:
+            self._buckets.popitem(last=False)
+        bucket = TokenBucket(ADMISSION_BOOTH_RATE, ADMISSION_BOOTH_BURST)
+        self._buckets[booth] = bucket
+        return bucket
+
+    def _check_queue(self, photos: int):
+        if photos and queue_depth() + photos > ADMISSION_MAX_QUEUE_DEPTH:
+            self._reject("queue_full", 503, RETRY_AFTER_QUEUE_FULL, "Post queue is full, try again later")
+
+    def _charge(self, booth: str, photos: int, prepaid: int = 0):
+        if photos > prepaid:
+            bucket = self._bucket(booth)
+            # Price the request as a whole, so a batch larger than the burst
+            # is not refused forever just because part of it was prepaid
+            bucket.tokens += prepaid
+            wait = bucket.take(photos)
+            if wait:
+                self._reject("rate_limited", 429, wait, "Upload rate limit exceeded for this booth")
+
+    def admit(self, booth: str, photos: int):
+        """
+        Reserves an in-flight slot or raises 429/503 with Retry-After.
+        Requests adding `photos` new photos (not chunk appends) pay one token
+        per photo from the booth's bucket and are refused when they would
+        push the post queue past its limit.
+        """
+        with self._lock:
+            free_mb = shutil.disk_usage(CAPTURED_DIR).free / (1024 * 1024)
+            if free_mb < ADMISSION_MIN_FREE_MB:
+                self._reject("disk_full", 503, RETRY_AFTER_DISK_FULL, "Server storage is full, try again later")
+
+            self._check_queue(photos)
+
+            if self.inflight >= ADMISSION_MAX_INFLIGHT:
+                self._reject("too_many_inflight", 503, RETRY_AFTER_INFLIGHT, "Too many uploads in progress")
+
+            self._charge(booth, photos)
+
+            self.inflight += 1
+            self.peak_inflight = max(self.peak_inflight, self.inflight)
+            self.admitted += 1
+
+    def admit_more(self, booth: str, photos: int, declared: int):
+        """
+        Charges an already admitted batch for all `photos` it carries when
+        that is more than the `declared` count it paid for in admit();
+        raises 429/503 like admit().
+        """
+        with self._lock:
+            self._check_queue(photos)
+            self._charge(booth, photos, prepaid=declared)
+
+    def release(self):
+        with self._lock:
+            self.inflight -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "inflight": self.inflight,
+                "peak_inflight": self.peak_inflight,
+                "tracked_booths": len(self._buckets),
+                "queue_depth": queue_depth(),
+                "free_disk_mb": int(shutil.disk_usage(CAPTURED_DIR).free / (1024 * 1024)),
+                "limits": {
+                    "booth_rate_per_second": ADMISSION_BOOTH_RATE,
+                    "booth_burst": ADMISSION_BOOTH_BURST,
+                    "max_inflight": ADMISSION_MAX_INFLIGHT,
+                    "max_queue_depth": ADMISSION_MAX_QUEUE_DEPTH,
+                    "min_free_mb": ADMISSION_MIN_FREE_MB
+                }
+            }
+
+
+controller = AdmissionController()
+
+
+class AdmissionRoute(APIRoute):
+    """
+    Route class for the capture router. Admission runs before the request
+    body is read, so rejected uploads are never received or spooled to disk.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def admitted_handler(request: Request):
+            if request.method not in ADMITTED_METHODS:
+                return await handler(request)
+
+            controller.admit(booth_id(request), declared_photos(request))
+            try:
+                return await handler(request)
+            finally:
+                controller.release()
+
+        return admitted_handler
@@ -0,0 +1,58 @@
+import os
+
+# --- Image compositing (branding overlay) ---
+# Number of worker processes used to burn the logo/frame into queued photos
+COMPOSITE_WORKERS = int(os.getenv("COMPOSITE_WORKERS", "2"))
+# Longest the scheduler waits for a composite/fingerprint before giving up on it
+COMPOSITE_TIMEOUT_SECONDS = float(os.getenv("COMPOSITE_TIMEOUT_SECONDS", "60"))
+
+# --- Capture uploads ---
+# Upper bound on photos accepted by a single batch upload request
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "500"))
+# Upper bound on the uncompressed size of a batch upload's zip archive
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+# --- Resumable uploads ---
+# Largest chunk accepted per append request
+RESUMABLE_MAX_CHUNK_BYTES = int(os.getenv("RESUMABLE_MAX_CHUNK_BYTES", str(8 * 1024 * 1024)))
+# Partial uploads idle for longer than this are garbage-collected
+RESUMABLE_UPLOAD_TTL_MINUTES = int(os.getenv("RESUMABLE_UPLOAD_TTL_MINUTES", "1440"))
+
+# --- Idempotency keys ---
+# Completed responses remembered for replay on client retries
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "1000"))
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 60 * 60)))
+# Larger responses are returned but not stored
+IDEMPOTENCY_MAX_BODY_BYTES = int(os.getenv("IDEMPOTENCY_MAX_BODY_BYTES", str(64 * 1024)))
+
+# --- Capture admission control ---
+# Per-booth token bucket: sustained uploads per second and burst size
+ADMISSION_BOOTH_RATE = float(os.getenv("ADMISSION_BOOTH_RATE", "2"))
+ADMISSION_BOOTH_BURST = int(os.getenv("ADMISSION_BOOTH_BURST", "20"))
+# Uploads processed at once across all booths
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "16"))
+# New photos are refused while the post queue is deeper than this
+ADMISSION_MAX_QUEUE_DEPTH = int(os.getenv("ADMISSION_MAX_QUEUE_DEPTH", "1000"))
+# Uploads are refused when the capture disk has less free space than this
+ADMISSION_MIN_FREE_MB = int(os.getenv("ADMISSION_MIN_FREE_MB", "500"))
+
+# --- Slideshow delta cursors ---
+# Photo add/remove events remembered; older cursors get a full snapshot
+SLIDESHOW_JOURNAL_SIZE = int(os.getenv("SLIDESHOW_JOURNAL_SIZE", "1000"))
+
+# --- Profiling (opt-in) ---
+# Nothing is installed unless PROFILING_ENABLED is set
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "").lower() in ("1", "true", "yes")
+# While enabled every request is profiled; kept are all requests slower than
+# PROFILE_SLOW_MS plus this fraction of the others
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))
+PROFILE_SLOW_MS = int(os.getenv("PROFILE_SLOW_MS", "1000"))
+# Profiles kept on disk per kind (request / job), oldest deleted first
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+
+# --- Logging ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Records waiting for the writer thread; further records are dropped, never blocked on
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# INFO/DEBUG lines allowed per message per minute (0 disables the limit)
+LOG_RATE_LIMIT_PER_MINUTE = int(os.getenv("LOG_RATE_LIMIT_PER_MINUTE", "60"))
@@ -0,0 +1,152 @@
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+from app.core.config import (
+    IDEMPOTENCY_MAX_ENTRIES,
+    IDEMPOTENCY_TTL_SECONDS,
+    IDEMPOTENCY_MAX_BODY_BYTES
+)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENT_METHODS = ("POST",)
+IDEMPOTENT_PREFIXES = ("/api/capture/", "/api/admin/")
+
+# Retrying these can legitimately succeed later, so they are never replayed
+TRANSIENT_STATUSES = (408, 409, 425, 429)
+
+
+class IdempotencyStore:
+    """
+    Completed responses keyed by idempotency key, bounded in size and
+    evicted after a TTL. Only touched from the event loop, so no locking.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, fingerprint, status, raw_headers, body)
+        self._inflight = {}  # key -> asyncio.Event set when the first request finishes
+
+    def _evict_expired(self, now: float):
+        # Entries are in insertion order, so expired ones sit at the front
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry[0] > now:
+                break
+            self._entries.pop(key)
+
+    def get(self, key):
+        now = time.monotonic()
+        self._evict_expired(now)
+        return self._entries.get(key)
+
+    def put(self, key, fingerprint: str, status: int, raw_headers, body: bytes):
+        now = time.monotonic()
+        self._evict_expired(now)
+        self._entries.pop(key, None)
+        self._entries[key] = (now + self.ttl_seconds, fingerprint, status, raw_headers, body)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def inflight(self, key):
+        return self._inflight.get(key)
+
+    def begin(self, key) -> asyncio.Event:
+        event = asyncio.Event()
+        self._inflight[key] = event
+        return event
+
+    def finish(self, key):
+        event = self._inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+
+store = IdempotencyStore(IDEMPOTENCY_MAX_ENTRIES, IDEMPOTENCY_TTL_SECONDS)
+
+
+async def _payload_fingerprint(request: Request) -> str:
+    """
+    Identifies the request payload so a reused key with a different payload
+    is refused. Small bodies are hashed; uploads are not buffered just for
+    this, they are identified by media type and length (multipart boundaries
+    differ between retries of the same upload).
+    """
+    content_type = request.headers.get("content-type", "")
+    media_type = content_type.split(";")[0].strip().lower()
+    content_length = request.headers.get("content-length", "")
+
+    if (
+        media_type != "multipart/form-data"
+        and content_length.isdigit()
+        and int(content_length) <= IDEMPOTENCY_MAX_BODY_BYTES
+    ):
+        body = await request.body()
+        return "body:" + hashlib.sha256(content_type.encode() + b"\0" + body).hexdigest()
+    return f"size:{media_type}:{content_length}"
+
+
+def _replay(entry) -> Response:
+    _, _, status, raw_headers, body = entry
+    response = Response(content=body, status_code=status)
+    response.raw_headers = list(raw_headers) + [(b"idempotent-replayed", b"true")]
+    return response
+
+
+async def idempotency_middleware(request: Request, call_next):
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if (
+        not key
+        or request.method not in IDEMPOTENT_METHODS
+        or not request.url.path.startswith(IDEMPOTENT_PREFIXES)
+    ):
+        return await call_next(request)
+
+    # Scope keys per endpoint and caller so clients cannot read each other's results
+    scoped_key = (
+        request.method,
+        request.url.path,
+        request.headers.get("authorization", ""),
+        key
+    )
+
+    fingerprint = await _payload_fingerprint(request)
+
+    # Wait for a concurrent request with the same key, then reuse its result.
+    # If it failed without a result, the first waiter to wake runs the work.
+    while True:
+        entry = store.get(scoped_key)
+        if entry is not None:
+            if entry[1] != fingerprint:
+                return JSONResponse(
+                    content={"detail": f"{IDEMPOTENCY_HEADER} was already used with a different request"},
+                    status_code=422
+                )
+            return _replay(entry)
+        event = store.inflight(scoped_key)
+        if event is None:
+            break
+        await event.wait()
+
+    store.begin(scoped_key)
+    try:
+        response = await call_next(request)
+        body = b"".join([chunk async for chunk in response.body_iterator])
+
+        if (
+            200 <= response.status_code < 500
+            and response.status_code not in TRANSIENT_STATUSES
+            and len(body) <= IDEMPOTENCY_MAX_BODY_BYTES
+        ):
+            store.put(scoped_key, fingerprint, response.status_code, response.raw_headers, body)
+
+        buffered = Response(content=body, status_code=response.status_code)
+        buffered.raw_headers = response.raw_headers
+        return buffered
+    finally:
+        store.finish(scoped_key)
@@ -0,0 +1,193 @@
+import re
+import sys
+import copy
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from starlette.requests import Request
+
+from app.core.config import LOG_LEVEL, LOG_QUEUE_SIZE, LOG_RATE_LIMIT_PER_MINUTE
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Correlation ids attached to every log line emitted in the current context
+request_id_var = contextvars.ContextVar("request_id", default=None)
+photo_var = contextvars.ContextVar("photo", default=None)
+job_id_var = contextvars.ContextVar("job_id", default=None)
+
+_CONTEXT_VARS = {"request_id": request_id_var, "photo": photo_var, "job_id": job_id_var}
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(logging.LogRecord("", 0, "", 0, "", None, None).__dict__) | {"message", "asctime"}
+
+_SECRET_PATTERNS = [
+    # access_token=..., client_secret=... in URLs and form bodies
+    (re.compile(r"((?:access_token|client_secret|fb_exchange_token|app_secret|user_token|page_token)=)[^&\s\"']+"), r"\1[REDACTED]"),
+    # "access_token": "..." in JSON / dict reprs
+    (re.compile(r"""(["']?(?:access_token|client_secret|app_secret|user_token|page_token|password)["']?\s*[:=]\s*["'])[^"']+"""), r"\1[REDACTED]"),
+    (re.compile(r"(Bearer\s+)[A-Za-z0-9\-._~+/]+=*", re.IGNORECASE), r"\1[REDACTED]"),
+    # Facebook tokens wherever they appear
+    (re.compile(r"\bEAA[A-Za-z0-9]{20,}"), "[REDACTED]"),
+]
+
+_listener = None
+
+
+def redact(text: str) -> str:
+    for pattern, replacement in _SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+@contextmanager
+def log_context(**ids):
+    """Sets correlation ids (request_id, photo, job_id) for the enclosed block."""
+    tokens = [(_CONTEXT_VARS[name], _CONTEXT_VARS[name].set(value)) for name, value in ids.items()]
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        for name, var in _CONTEXT_VARS.items():
+            if not hasattr(record, name):
+                setattr(record, name, var.get())
+        return True
+
+
+class RedactFilter(logging.Filter):
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and isinstance(value, str):
+                record.__dict__[key] = redact(value)
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `per_minute` INFO/DEBUG records per message template
+    and logger; the next record that passes reports how many were dropped.
+    Warnings and errors are never dropped.
+    """
+
+    def __init__(self, per_minute: int):
+        super().__init__()
+        self.per_minute = per_minute
+        self._lock = threading.Lock()
+        self._windows = {}  # (logger, template) -> [window_start, count, suppressed]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.per_minute <= 0:
+            return True
+
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= 60:
+                suppressed = window[2] if window else 0
+                window = [now, 0, 0]
+                self._windows[key] = window
+                if suppressed:
+                    record.suppressed = suppressed
+            if window[1] >= self.per_minute:
+                window[2] += 1
+                return False
+            window[1] += 1
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the listener thread; drops them if the queue is full."""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and traceback here, the formatter runs on the listener
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = redact(logging.Formatter().formatException(record.exc_info))
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+def setup_logging():
+    """Routes app logging through a background thread writing JSON lines to stdout."""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    # Filters run in the calling thread, where the context vars are set
+    handler.addFilter(ContextFilter())
+    handler.addFilter(RateLimitFilter(LOG_RATE_LIMIT_PER_MINUTE))
+    handler.addFilter(RedactFilter())
+
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(LOG_LEVEL)
+    app_logger.addHandler(handler)
+    app_logger.propagate = False
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Flushes queued records; call on shutdown."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+async def request_context_middleware(request: Request, call_next):
+    """Tags logs with the caller's X-Request-ID (or a fresh one) and echoes it back."""
+    request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
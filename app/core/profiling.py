@@ -0,0 +1,186 @@
+import os
+import re
+import time
+import random
+import pstats
+import asyncio
+import cProfile
+import functools
+import threading
+import contextvars
+from datetime import datetime
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+
+from app.core.config import (
+    PROFILING_ENABLED,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_SLOW_MS,
+    PROFILE_MAX_FILES
+)
+
+# Outside app/static: profiles are only downloadable through the admin API
+PROFILE_DIR = "app/profiles"
+PROFILE_SUFFIX = ".prof"  # cProfile/pstats format (pstats, snakeviz, ...)
+
+# Only one cProfile can be active at a time; anything that cannot get this
+# lock while another profile is running just runs unprofiled.
+_profiler_lock = threading.Lock()
+
+# Profilers started in threadpool workers for the request being profiled;
+# the context (and so this list) is copied into the worker thread
+_thread_profilers = contextvars.ContextVar("thread_profilers", default=None)
+
+if PROFILING_ENABLED:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+
+
+def _slug(label: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "-", label).strip("-")[:60] or "root"
+
+
+def _prune(kind: str):
+    files = sorted(
+        f for f in os.listdir(PROFILE_DIR)
+        if f.endswith(PROFILE_SUFFIX) and f.split("_")[1] == kind
+    )
+    for name in files[:max(0, len(files) - PROFILE_MAX_FILES)]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+def save_profile(profiler: cProfile.Profile, kind: str, label: str, elapsed_ms: float, threads=()) -> str:
+    # <utc timestamp>_<kind>_<label>_<ms>ms.prof, so names sort oldest first
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    name = f"{stamp}_{kind}_{_slug(label)}_{int(elapsed_ms)}ms{PROFILE_SUFFIX}"
+    stats = pstats.Stats(profiler)
+    for thread_profiler in threads:
+        stats.add(thread_profiler)
+    stats.dump_stats(os.path.join(PROFILE_DIR, name))
+    _prune(kind)
+    return name
+
+
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith(PROFILE_SUFFIX):
+            continue
+        path = os.path.join(PROFILE_DIR, name)
+        profiles.append({
+            "name": name,
+            "kind": name.split("_")[1],
+            "size": os.path.getsize(path),
+            "created": datetime.utcfromtimestamp(os.path.getmtime(path)).isoformat()
+        })
+    return profiles
+
+
+def profile_path(name: str):
+    """Returns the path of a stored profile, or None for unknown/unsafe names."""
+    if os.path.basename(name) != name or not name.endswith(PROFILE_SUFFIX):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def _request_label(request: Request) -> str:
+    # Route template ("/uploads/{upload_id}") once routed, so per-id URLs group together
+    route = request.scope.get("route")
+    return f"{request.method} {getattr(route, 'path', request.url.path)}"
+
+
+async def profiling_middleware(request: Request, call_next):
+    """
+    Profiles every request while profiling is enabled and keeps the profile
+    for every request slower than PROFILE_SLOW_MS plus a PROFILE_SAMPLE_RATE
+    fraction of the rest. Sync endpoints are profiled in their worker thread
+    (see profile_sync_endpoints) and merged into the same profile.
+    """
+    if not _profiler_lock.acquire(blocking=False):
+        return await call_next(request)
+
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    threads = []
+    token = _thread_profilers.set(threads)
+    try:
+        profiler.enable()
+        try:
+            response = await call_next(request)
+        finally:
+            profiler.disable()
+    finally:
+        _thread_profilers.reset(token)
+        _profiler_lock.release()
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if elapsed_ms >= PROFILE_SLOW_MS or random.random() < PROFILE_SAMPLE_RATE:
+        label = _request_label(request)
+        await run_in_threadpool(save_profile, profiler, "request", label, elapsed_ms, threads)
+    return response
+
+
+def _profiled_in_thread(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        threads = _thread_profilers.get()
+        if threads is None:
+            return func(*args, **kwargs)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler, which already covers every thread
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            threads.append(profiler)
+
+    return wrapper
+
+
+def profile_sync_endpoints(app):
+    """
+    Wraps every sync endpoint so that, while its request is being profiled,
+    the handler is profiled inside the threadpool worker it runs on.
+    Call after all routers are included.
+    """
+    for route in app.routes:
+        if isinstance(route, APIRoute) and not asyncio.iscoroutinefunction(route.dependant.call):
+            route.dependant.call = _profiled_in_thread(route.dependant.call)
+
+
+def profile_job(func):
+    """Wraps a scheduler job so every run is profiled (no-op when profiling is off)."""
+    if not PROFILING_ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _profiler_lock.acquire(blocking=False):
+            return func(*args, **kwargs)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.disable()
+        finally:
+            _profiler_lock.release()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            save_profile(profiler, "job", func.__name__, elapsed_ms)
+
+    return wrapper
@@ -1,56 +1,124 @@
 import os
-import json
+import uuid
+import logging
 from apscheduler.schedulers.background import BackgroundScheduler
-from app.services.facebook_poster import post_photo_to_facebook
+from app.services.facebook_poster import post_photo_to_facebook, PostRejected
+from app.services.image_handler import get_post_image, remove_composites
+from app.services.resumable_upload import purge_stale_uploads
+from app.services import photo_index
+from app.services.dedupe import plan_next_post
+from app.core.config import RESUMABLE_UPLOAD_TTL_MINUTES
+from app.core.profiling import profile_job
+from app.core.logging_config import log_context
 from app.models.settings import load_settings
+from app.utils.post_queue import load_queue, remove_from_queue, queue_lock
+from app.utils import phash_index
 
-POST_QUEUE_FILE = "app/static/queue.json"
 CAPTURED_DIR = "app/static/captured_images"
 
 scheduler = BackgroundScheduler()
+logger = logging.getLogger(__name__)
 
 def process_queue():
-    if not os.path.exists(POST_QUEUE_FILE):
-        return
+    with log_context(job_id=uuid.uuid4().hex[:12]):
+        _process_next()
 
-    with open(POST_QUEUE_FILE, "r") as f:
-        queue = json.load(f)
-
-    if not queue:
-        return
+def _plan(queue, settings):
+    try:
+        return plan_next_post(queue, settings)
+    except Exception:
+        logger.exception("Near-duplicate check failed, posting head of queue")
+        return queue[0]["filename"], []
 
+def _process_next():
     settings = load_settings()
-    interval_minutes = settings.get("post_interval_minutes", 3)
 
-    next_item = queue.pop(0)
-    filename = next_item["filename"]
+    # Collapse near-duplicate bursts so only the sharpest frame is posted
+    while True:
+        queue = load_queue()
+        if not queue:
+            return
+        filename, collapsed = _plan(queue, settings)
+        if filename is not None:
+            break
+        # Repeats a photo already posted: drop it from the queue (it stays in the slideshow)
+        remove_from_queue(*collapsed)
+        phash_index.update_entries({name: {"collapsed": True} for name in collapsed})
+        logger.info("Skipped near-duplicate of a posted photo", extra={"photo": collapsed[0]})
 
-    image_path = os.path.join(CAPTURED_DIR, filename)
+    with log_context(photo=filename):
+        # Branded copy when an overlay is configured, otherwise the original
+        image_path = get_post_image(filename)
 
-    try:
-        post_photo_to_facebook(image_path)
-    except Exception as e:
-        print(f"Failed to post {filename}: {e}")
-        queue.insert(0, next_item)  # Requeue
-        return
-
-    # Save updated queue
-    with open(POST_QUEUE_FILE, "w") as f:
-        json.dump(queue, f, indent=4)
-
-    # Enforce max photo count
-    max_photos = settings.get("max_photos", 50)
-    photos = sorted(
-        os.listdir(CAPTURED_DIR),
-        key=lambda x: os.path.getctime(os.path.join(CAPTURED_DIR, x))
-    )
-    while len(photos) > max_photos:
-        to_delete = photos.pop(0)
-        os.remove(os.path.join(CAPTURED_DIR, to_delete))
+        try:
+            posted = post_photo_to_facebook(image_path)
+        except PostRejected:
+            # Would fail forever and block everything queued behind it; its
+            # burst is re-planned next run so the next best frame is posted
+            logger.exception("Facebook rejected the photo, dropping it from the queue")
+            remove_from_queue(filename)
+            phash_index.update_entries({filename: {"rejected": True}})
+            return
+        except Exception:
+            logger.exception("Failed to post, will retry next run")
+            posted = False
+
+        if not posted:
+            if not os.path.exists(os.path.join(CAPTURED_DIR, filename)):
+                # Deleted from disk: drop it alone, its burst is re-planned next run
+                logger.error("Queued photo is missing, dropping it from the queue")
+                remove_from_queue(filename)
+            # Otherwise left in the queue and retried next run; nothing is collapsed
+            return
+
+    # Re-read under the lock so uploads queued while posting are kept
+    remove_from_queue(filename, *collapsed)
+    updates = {name: {"collapsed": True, "collapsed_into": filename} for name in collapsed}
+    updates[filename] = {"posted": True}
+    phash_index.update_entries(updates)
+    if collapsed:
+        logger.info("Collapsed near-duplicate burst", extra={"photo": filename, "count": len(collapsed)})
+
+    prune_photos(settings.get("max_photos", 50))
+
+def prune_photos(max_photos: int):
+    """
+    Deletes the oldest photos beyond max_photos. Photos still waiting in the
+    post queue are never deleted, so a large backlog can exceed the limit
+    until it has been posted.
+    """
+    # Held so a photo cannot be queued between reading the queue and deleting
+    with queue_lock:
+        queued = {item["filename"] for item in load_queue()}
+        photos = sorted(
+            os.listdir(CAPTURED_DIR),
+            key=lambda x: os.path.getctime(os.path.join(CAPTURED_DIR, x))
+        )
+        excess = len(photos) - max_photos
+        deleted = []
+        for to_delete in photos:
+            if excess <= 0:
+                break
+            if to_delete in queued:
+                continue
+            os.remove(os.path.join(CAPTURED_DIR, to_delete))
+            deleted.append(to_delete)
+            excess -= 1
+
+    for name in deleted:
+        remove_composites(name)
+    photo_index.record_removed(deleted)
+    phash_index.remove_entries(deleted)
+
+def purge_partial_uploads():
+    removed = purge_stale_uploads(RESUMABLE_UPLOAD_TTL_MINUTES * 60)
+    if removed:
+        logger.info("Removed stale partial uploads", extra={"count": removed})
 
 def start_scheduler():
     settings = load_settings()
     interval_minutes = settings.get("post_interval_minutes", 3)
-    print("time to post: ", interval_minutes)
-    scheduler.add_job(process_queue, "interval", minutes=interval_minutes)
+    logger.info("Starting scheduler", extra={"post_interval_minutes": interval_minutes})
+    scheduler.add_job(profile_job(process_queue), "interval", minutes=interval_minutes)
+    scheduler.add_job(purge_partial_uploads, "interval", minutes=10)
     scheduler.start()
@@ -1,16 +1,28 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from starlette.middleware.base import BaseHTTPMiddleware
 
 from app.api.endpoints import auth, capture, admin, slideshow
 from app.core.scheduler import start_scheduler
+from app.core.idempotency import idempotency_middleware
+from app.core.config import PROFILING_ENABLED
+from app.core.logging_config import setup_logging, stop_logging, request_context_middleware
+from app.core.profiling import profiling_middleware, profile_sync_endpoints
+from app.services.image_handler import shutdown_pool
+from app.utils.post_queue import queue_depth
 
 # 👇 Add these imports
 from app.core.security import Base  # SQLAlchemy Base
 from app.database import engine
 
+setup_logging()
+
 app = FastAPI(title="TMTSelfie Backend")
 
+# Replay results of capture/admin POSTs retried with the same Idempotency-Key
+app.add_middleware(BaseHTTPMiddleware, dispatch=idempotency_middleware)
+
 # CORS setup (update origin if needed)
 app.add_middleware(
     CORSMiddleware,
@@ -20,6 +32,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Correlation id for every log line emitted while handling a request
+app.add_middleware(BaseHTTPMiddleware, dispatch=request_context_middleware)
+
+# Opt-in profiling; not installed at all unless PROFILING_ENABLED is set
+if PROFILING_ENABLED:
+    app.add_middleware(BaseHTTPMiddleware, dispatch=profiling_middleware)
+
 # Mount static files (e.g., images, uploaded logo/background)
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
@@ -32,7 +51,18 @@ app.include_router(capture.router, prefix="/api/capture", tags=["capture"])
 app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 app.include_router(slideshow.router, prefix="/api/slideshow", tags=["slideshow"])
 
+# Sync endpoints run on the threadpool, out of sight of the request profiler
+if PROFILING_ENABLED:
+    profile_sync_endpoints(app)
+
 # Start background scheduler (for posting queue)
 @app.on_event("startup")
 async def startup_event():
+    # Seed the cached queue depth so admission checks never wait on queue_lock
+    queue_depth()
     start_scheduler()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_pool()
+    stop_logging()
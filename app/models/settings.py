@@ -15,7 +15,14 @@ DEFAULT_SETTINGS = {
     "post_interval_minutes": 3,
     "page_title": "TMTSelfie Booth",
     "logo_filename": "",
-    "background_filename": ""
+    "background_filename": "",
+    "frame_filename": "",
+    "overlay_mode": "",  # "", "logo" or "frame": branding burned into posted photos
+    # Near-duplicate bursts: frames from one booth within the window whose
+    # 64-bit perceptual hashes differ in at most `dedupe_threshold` bits
+    "dedupe_enabled": True,
+    "dedupe_threshold": 6,
+    "dedupe_window_seconds": 10
 }
 
 def load_settings():
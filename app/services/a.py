@@ -10,4 +10,4 @@ with open(credentials_path, 'r') as file:
     token = lines[1].strip()
 
 print("Page ID:", page_id)
-print("Token: ", token)
\ No newline at end of file
+print("Token loaded:", bool(token))
\ No newline at end of file
@@ -0,0 +1,138 @@
+import os
+import logging
+import threading
+from datetime import datetime
+
+from app.core.config import COMPOSITE_TIMEOUT_SECONDS
+from app.services.image_handler import CAPTURED_DIR, fingerprint_image, submit_to_pool
+from app.utils import phash_index
+
+logger = logging.getLogger(__name__)
+
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+class _FingerprintBatch:
+    """Collects the fingerprints of one upload and writes them to the index together."""
+
+    def __init__(self, count: int):
+        self._lock = threading.Lock()
+        self._remaining = count
+        self._results = {}
+
+    def done(self, filename: str, future):
+        try:
+            result = future.result()
+        except Exception:
+            logger.warning("Fingerprinting failed", exc_info=True, extra={"photo": filename})
+            result = None
+        self.add(filename, result)
+
+    def add(self, filename: str, result):
+        with self._lock:
+            if result is not None:
+                self._results[filename] = result
+            self._remaining -= 1
+            if self._remaining:
+                return
+        try:
+            phash_index.update_entries(self._results)
+        except Exception:
+            logger.warning("Could not store fingerprints", exc_info=True)
+
+
+def submit_fingerprints(filenames, booth: str, captured_at: dict):
+    """
+    Records booth and capture time for new photos and hashes them on the
+    process pool. `captured_at` maps filename -> ISO timestamp. The index is
+    written once up front and once when every hash of the batch is done.
+    """
+    if not filenames:
+        return
+    phash_index.update_entries({
+        name: {"booth": booth, "captured_at": captured_at[name]} for name in filenames
+    })
+    batch = _FingerprintBatch(len(filenames))
+    for name in filenames:
+        try:
+            future = submit_to_pool(fingerprint_image, os.path.join(CAPTURED_DIR, name))
+        except Exception:
+            logger.warning("Could not schedule fingerprinting", exc_info=True, extra={"photo": name})
+            batch.add(name, None)
+            continue
+        future.add_done_callback(lambda f, n=name: batch.done(n, f))
+
+
+def _fingerprinted(filename: str):
+    """Index entry with a hash, computing it now if the capture-time job has not finished."""
+    entry = phash_index.get_entry(filename)
+    if not entry or not entry.get("booth"):
+        return None  # Unknown origin: never collapsed
+    if not entry.get("hash"):
+        try:
+            future = submit_to_pool(fingerprint_image, os.path.join(CAPTURED_DIR, filename))
+            fingerprint = future.result(timeout=COMPOSITE_TIMEOUT_SECONDS)
+        except Exception:
+            logger.warning("Fingerprinting failed", exc_info=True, extra={"photo": filename})
+            return None
+        phash_index.update_entries({filename: fingerprint})
+        entry.update(fingerprint)
+    return entry
+
+
+def _within(entry: dict, other: dict, window_seconds: float) -> bool:
+    delta = datetime.fromisoformat(entry["captured_at"]) - datetime.fromisoformat(other["captured_at"])
+    return abs(delta.total_seconds()) <= window_seconds
+
+
+def plan_next_post(queue, settings: dict):
+    """
+    Decides what to post for the item at the head of the queue.
+    Returns (filename_to_post or None, filenames_collapsed): frames from the
+    same booth within the time window whose hashes are within the threshold
+    form a burst, and only the sharpest one is posted. A head that repeats a
+    photo already posted is collapsed without posting anything.
+    """
+    head = queue[0]["filename"]
+    if not settings.get("dedupe_enabled", True):
+        return head, []
+
+    threshold = settings.get("dedupe_threshold", 6)
+    window = settings.get("dedupe_window_seconds", 10)
+
+    head_entry = _fingerprinted(head)
+    if head_entry is None:
+        return head, []
+
+    index = phash_index.all_entries()
+
+    def nearby(name):
+        # Cheap checks first; hashes are only needed for photos that pass them
+        entry = index.get(name)
+        return (
+            entry is not None
+            and entry.get("booth") == head_entry["booth"]
+            and entry.get("captured_at")
+            and _within(entry, head_entry, window)
+        )
+
+    def similar(entry):
+        return entry.get("hash") and hamming(entry["hash"], head_entry["hash"]) <= threshold
+
+    for name, entry in index.items():
+        if entry.get("posted") and nearby(name) and similar(entry):
+            return None, [head]
+
+    burst = {head: head_entry}
+    for item in queue[1:]:
+        name = item["filename"]
+        if name in burst or not nearby(name):
+            continue
+        entry = _fingerprinted(name)
+        if entry and similar(entry):
+            burst[name] = entry
+
+    best = max(burst, key=lambda name: burst[name].get("sharpness", 0))
+    return best, [name for name in burst if name != best]
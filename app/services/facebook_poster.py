@@ -1,9 +1,30 @@
 import os
 import time
+import logging
 import requests
 from app.utils.fb_data import load_fb_data, save_fb_data
 from app.models.settings import load_settings, save_settings
 
+logger = logging.getLogger(__name__)
+
+# Graph error codes meaning the token/permissions are at fault, not the photo
+GRAPH_AUTH_ERROR_CODES = (10, 102, 190, 200)
+
+
+class PostRejected(Exception):
+    """Facebook refused the photo itself; posting it again will not help."""
+
+
+def _is_permanent_rejection(response) -> bool:
+    if response.status_code == 429 or not 400 <= response.status_code < 500:
+        return False  # Throttled or server side: retry later
+    if response.status_code in (401, 403):
+        return False  # Credentials: retry once they are fixed
+    try:
+        error = response.json().get("error", {})
+    except ValueError:
+        error = {}
+    return error.get("type") != "OAuthException" and error.get("code") not in GRAPH_AUTH_ERROR_CODES
 
 def refresh_fb_page_token_if_needed(short_lived_user_token: str) -> str:
     fb_data = load_fb_data()
@@ -15,10 +36,10 @@ def refresh_fb_page_token_if_needed(short_lived_user_token: str) -> str:
     is_initial_short_token = token_expiry == 0 or token_expiry < time.time()
 
     if stored_token and not is_initial_short_token:
-        print("🔁 Reusing cached page token.")
+        logger.debug("Reusing cached page token")
         return stored_token
 
-    print("🔄 Refreshing page access token...")
+    logger.info("Refreshing page access token")
 
     # Step 1: Exchange short-lived user token for long-lived user token
     exchange_url = "https://graph.facebook.com/v18.0/oauth/access_token"
@@ -57,11 +78,16 @@ def refresh_fb_page_token_if_needed(short_lived_user_token: str) -> str:
     fb_data["token_expiry"] = token_expiry
     save_fb_data(fb_data)
 
-    print("✅ New long-lived page token saved.")
+    logger.info("New long-lived page token saved")
     return page_token
 
 
-def post_photo_to_facebook(image_path: str, frontend_user_token: str = None):
+def post_photo_to_facebook(image_path: str, frontend_user_token: str = None) -> bool:
+    """
+    Returns True only once Facebook has confirmed the post (HTTP 200) and
+    False for failures worth retrying (credentials, throttling, 5xx).
+    Raises PostRejected when the photo itself is refused (other 4xx).
+    """
     settings = load_settings()
     fb_data = load_fb_data()
 
@@ -71,12 +97,10 @@ def post_photo_to_facebook(image_path: str, frontend_user_token: str = None):
         token = fb_data.get("user_token")
 
     page_id = fb_data.get("page_id")
-    print("🔐 TOKEN USED:", token[:50], "...")
-    print("📄 PAGE ID:", page_id)
 
     if not token or not page_id:
-        print("❌ Missing Facebook credentials.")
-        return
+        logger.error("Missing Facebook credentials")
+        return False
 
     # Rotate captions
     captions = settings.get("caption_templates", [])
@@ -104,10 +128,17 @@ def post_photo_to_facebook(image_path: str, frontend_user_token: str = None):
             endpoint = f"https://graph.facebook.com/v18.0/{page_id}/photos"
             response = requests.post(endpoint, files=files, data=data)
     except FileNotFoundError:
-        print(f"❌ Image not found: {image_path}")
-        return
+        logger.error("Image not found", extra={"path": image_path})
+        return False
 
     if response.status_code == 200:
-        print("✅ Posted to Facebook successfully.")
-    else:
-        print(f"❌ Failed to post: {response.status_code} - {response.text}")
+        logger.info("Posted to Facebook", extra={"page_id": page_id})
+        return True
+
+    logger.error(
+        "Failed to post to Facebook",
+        extra={"page_id": page_id, "status": response.status_code, "response": response.text[:500]}
+    )
+    if _is_permanent_rejection(response):
+        raise PostRejected(f"Facebook rejected the photo (HTTP {response.status_code})")
+    return False
@@ -0,0 +1,259 @@
+import os
+import glob
+import logging
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image, ImageFilter, ImageOps, ImageStat
+
+from app.core.config import COMPOSITE_WORKERS, COMPOSITE_TIMEOUT_SECONDS
+from app.models.settings import load_settings
+
+CAPTURED_DIR = "app/static/captured_images"
+COMPOSITED_DIR = "app/static/composited"
+
+logger = logging.getLogger(__name__)
+
+OVERLAY_MODES = ("logo", "frame")
+LOGO_WIDTH_RATIO = 0.2   # Logo width relative to the photo width
+LOGO_MARGIN_RATIO = 0.03  # Margin from the bottom-right corner
+JPEG_QUALITY = 90
+
+HASH_SIZE = 8  # dHash grid: 8x8 = 64-bit fingerprint
+SHARPNESS_MAX_SIDE = 512  # Sharpness is measured on a downscaled copy
+# 8-bit kernels clip at 0, so the Laplacian is taken as its positive and
+# negative parts and recombined
+LAPLACIAN_POS = ImageFilter.Kernel((3, 3), [0, 1, 0, 1, -4, 1, 0, 1, 0], scale=1, offset=0)
+LAPLACIAN_NEG = ImageFilter.Kernel((3, 3), [0, -1, 0, -1, 4, -1, 0, -1, 0], scale=1, offset=0)
+
+os.makedirs(COMPOSITED_DIR, exist_ok=True)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Composites submitted but not finished yet (parent process only): dest -> Future
+_pending = {}
+_pending_lock = threading.RLock()
+
+# Decoded overlays, kept per worker process: path -> {"stamp", "image", "scaled"}
+_overlay_cache = {}
+
+
+def _asset_path(url: str) -> str:
+    # Settings store public URLs ("/static/uploads/x.png"); files live under app/
+    return os.path.join("app", url.lstrip("/"))
+
+
+def resolve_overlay(settings: dict = None):
+    """
+    Returns (mode, overlay_path, version) for the overlay configured in
+    settings, or None when branding is off or the asset is missing.
+    """
+    settings = settings or load_settings()
+    mode = settings.get("overlay_mode", "")
+    if mode not in OVERLAY_MODES:
+        return None
+
+    url = settings.get("logo_filename" if mode == "logo" else "frame_filename", "")
+    if not url:
+        return None
+
+    path = _asset_path(url)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    # Version changes whenever the asset file (or the mode) changes
+    stamp = f"{mode}:{path}:{stat.st_mtime_ns}:{stat.st_size}"
+    version = hashlib.sha1(stamp.encode()).hexdigest()[:12]
+    return mode, path, version
+
+
+def composited_path(filename: str, version: str) -> str:
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(COMPOSITED_DIR, f"{stem}_{version}.jpg")
+
+
+def _load_overlay(path: str, size: tuple, mode: str) -> Image.Image:
+    # Decode once per asset version, then reuse the scaled copy per photo size
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    entry = _overlay_cache.get(path)
+    if entry is None or entry["stamp"] != stamp:
+        with Image.open(path) as img:
+            decoded = img.convert("RGBA")
+        entry = {"stamp": stamp, "image": decoded, "scaled": {}}
+        _overlay_cache[path] = entry
+
+    key = (mode, size)
+    scaled = entry["scaled"].get(key)
+    if scaled is None:
+        overlay = entry["image"]
+        if mode == "frame":
+            scaled = overlay.resize(size, Image.LANCZOS)
+        else:
+            width = max(1, int(size[0] * LOGO_WIDTH_RATIO))
+            height = max(1, int(overlay.height * width / overlay.width))
+            scaled = overlay.resize((width, height), Image.LANCZOS)
+        entry["scaled"][key] = scaled
+    return scaled
+
+
+def composite_image(src_path: str, dest_path: str, mode: str, overlay_path: str) -> str:
+    """Burns the overlay into the photo. Runs inside a pool worker."""
+    with Image.open(src_path) as img:
+        photo = ImageOps.exif_transpose(img).convert("RGBA")
+
+    overlay = _load_overlay(overlay_path, photo.size, mode)
+
+    if mode == "frame":
+        photo.alpha_composite(overlay)
+    else:
+        margin = int(photo.width * LOGO_MARGIN_RATIO)
+        x = max(0, photo.width - overlay.width - margin)
+        y = max(0, photo.height - overlay.height - margin)
+        photo.alpha_composite(overlay, dest=(x, y))
+
+    # Write to a temp file first so readers never see a half-written JPEG
+    tmp_path = dest_path + ".tmp"
+    photo.convert("RGB").save(tmp_path, "JPEG", quality=JPEG_QUALITY)
+    os.replace(tmp_path, dest_path)
+    return dest_path
+
+
+def _laplacian_variance(gray: Image.Image) -> float:
+    if gray.width < 3 or gray.height < 3:
+        return 0.0
+    # Kernel filters copy the 1-px border unfiltered; measure the interior only
+    interior = (1, 1, gray.width - 1, gray.height - 1)
+    pos = ImageStat.Stat(gray.filter(LAPLACIAN_POS).crop(interior))
+    neg = ImageStat.Stat(gray.filter(LAPLACIAN_NEG).crop(interior))
+    # At each pixel one part is zero, so the signed response r = pos - neg has
+    # sum(r) = pos.sum - neg.sum and sum(r^2) = pos.sum2 + neg.sum2
+    count = pos.count[0]
+    mean = (pos.sum[0] - neg.sum[0]) / count
+    return (pos.sum2[0] + neg.sum2[0]) / count - mean * mean
+
+
+def fingerprint_image(path: str) -> dict:
+    """
+    Perceptual difference hash (dHash) plus a sharpness score (variance of
+    the Laplacian). Runs inside a pool worker.
+    """
+    with Image.open(path) as img:
+        img.draft("L", (SHARPNESS_MAX_SIDE, SHARPNESS_MAX_SIDE))  # Cheap JPEG downscale on decode
+        gray = ImageOps.exif_transpose(img).convert("L")
+
+    small = gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + col]
+            right = pixels[row * (HASH_SIZE + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+
+    gray.thumbnail((SHARPNESS_MAX_SIDE, SHARPNESS_MAX_SIDE))
+    sharpness = _laplacian_variance(gray)
+
+    return {"hash": f"{bits:016x}", "sharpness": round(sharpness, 2)}
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool._broken:
+            # A worker died (OOM, killed); the executor never recovers on its own
+            logger.warning("Image worker pool is broken, starting a new one")
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            # spawn: the web process is multi-threaded, forking it is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=COMPOSITE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def submit_to_pool(fn, *args):
+    """Submits to the worker pool, replacing it once if it broke in the meantime."""
+    try:
+        return get_pool().submit(fn, *args)
+    except BrokenProcessPool:
+        return get_pool().submit(fn, *args)
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _clear_pending(dest: str):
+    with _pending_lock:
+        _pending.pop(dest, None)
+
+
+def submit_composite(filename: str, overlay=None):
+    """
+    Queues compositing of a captured photo with the current overlay.
+    Returns the Future, or None when branding is off or the result is cached.
+    """
+    overlay = overlay or resolve_overlay()
+    if overlay is None:
+        return None
+
+    mode, overlay_path, version = overlay
+    dest = composited_path(filename, version)
+    if os.path.exists(dest):
+        return None
+
+    with _pending_lock:
+        future = _pending.get(dest)
+        if future is None:
+            src = os.path.join(CAPTURED_DIR, filename)
+            future = submit_to_pool(composite_image, src, dest, mode, overlay_path)
+            _pending[dest] = future
+            future.add_done_callback(lambda _f: _clear_pending(dest))
+    return future
+
+
+def get_post_image(filename: str) -> str:
+    """
+    Returns the path of the image to post: the branded copy when an overlay
+    is configured, otherwise the original capture.
+    """
+    original = os.path.join(CAPTURED_DIR, filename)
+    overlay = resolve_overlay()
+    if overlay is None:
+        return original
+
+    dest = composited_path(filename, overlay[2])
+    if os.path.exists(dest):
+        return dest
+
+    try:
+        future = submit_composite(filename, overlay)
+        if future is not None:
+            future.result(timeout=COMPOSITE_TIMEOUT_SECONDS)
+        return dest
+    except Exception:
+        logger.warning("Compositing failed, posting original", exc_info=True, extra={"photo": filename})
+        return original
+
+
+def remove_composites(filename: str):
+    """Deletes every cached composite (all asset versions) of a photo."""
+    stem = os.path.splitext(filename)[0]
+    for path in glob.glob(os.path.join(COMPOSITED_DIR, glob.escape(stem) + "_*.jpg")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
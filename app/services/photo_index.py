@@ -0,0 +1,57 @@
+import uuid
+import threading
+from collections import deque
+
+from app.core.config import SLIDESHOW_JOURNAL_SIZE
+
+# The journal lives in memory, so cursors issued before a restart (another
+# generation) always fall back to a full snapshot.
+GENERATION = uuid.uuid4().hex[:8]
+
+_lock = threading.Lock()
+_seq = 0
+_events = deque(maxlen=SLIDESHOW_JOURNAL_SIZE)  # (seq, "added"|"removed", filename)
+
+
+def _record(op: str, filenames):
+    global _seq
+    with _lock:
+        for name in filenames:
+            _seq += 1
+            _events.append((_seq, op, name))
+
+
+def record_added(filenames):
+    _record("added", filenames)
+
+
+def record_removed(filenames):
+    _record("removed", filenames)
+
+
+def current_seq() -> int:
+    with _lock:
+        return _seq
+
+
+def changes_since(seq: int):
+    """
+    Returns (added, removed, latest_seq) for everything recorded after
+    `seq`, or None when the journal no longer reaches back that far.
+    """
+    with _lock:
+        if seq > _seq:
+            return None
+        oldest_kept = _events[0][0] if _events else _seq + 1
+        if seq + 1 < oldest_kept:
+            return None
+        events = [event for event in _events if event[0] > seq]
+        latest = _seq
+
+    # Net effect: the last event for each photo wins
+    state = {}
+    for _, op, name in events:
+        state[name] = op
+    added = [name for name, op in state.items() if op == "added"]
+    removed = [name for name, op in state.items() if op == "removed"]
+    return added, removed, latest
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import uuid
+import threading
+
+# Partial uploads live outside app/static so they are never publicly served
+PARTIAL_DIR = "app/partial_uploads"
+
+os.makedirs(PARTIAL_DIR, exist_ok=True)
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+class OffsetMismatch(Exception):
+    """Raised when a chunk does not start where the stored data ends."""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Expected offset {offset}")
+        self.offset = offset
+
+
+def _lock_for(upload_id: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(upload_id, threading.Lock())
+
+
+def _drop_lock(upload_id: str):
+    with _locks_guard:
+        _locks.pop(upload_id, None)
+
+
+def _paths(upload_id: str):
+    # Ids are generated by us; reject anything else to avoid path traversal
+    if not upload_id or not all(c in "0123456789abcdef" for c in upload_id):
+        raise KeyError(upload_id)
+    base = os.path.join(PARTIAL_DIR, upload_id)
+    return base + ".part", base + ".json"
+
+
+def _load_meta(upload_id: str) -> dict:
+    data_path, meta_path = _paths(upload_id)
+    try:
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        meta["offset"] = os.path.getsize(data_path)
+    except FileNotFoundError:
+        raise KeyError(upload_id)  # Never created, or finalized/discarded meanwhile
+    return meta
+
+
+def create_upload(filename: str, content_type: str, size: int = None, captured_at: str = None) -> str:
+    upload_id = uuid.uuid4().hex
+    data_path, meta_path = _paths(upload_id)
+    open(data_path, "wb").close()
+    with open(meta_path, "w") as f:
+        json.dump({
+            "filename": filename,
+            "content_type": content_type,
+            "size": size,
+            "captured_at": captured_at,
+            "created": time.time()
+        }, f)
+    return upload_id
+
+
+def get_upload(upload_id: str) -> dict:
+    """Returns the upload metadata including the current `offset`."""
+    return _load_meta(upload_id)
+
+
+def append_chunk(upload_id: str, offset: int, data: bytes) -> int:
+    """Appends a chunk at `offset` and returns the new offset."""
+    with _lock_for(upload_id):
+        meta = _load_meta(upload_id)
+        if offset != meta["offset"]:
+            raise OffsetMismatch(meta["offset"])
+
+        new_offset = offset + len(data)
+        if meta["size"] is not None and new_offset > meta["size"]:
+            raise ValueError("Chunk exceeds the declared upload size")
+
+        data_path, _ = _paths(upload_id)
+        with open(data_path, "ab") as f:
+            f.write(data)
+        return new_offset
+
+
+def finalize_upload(upload_id: str, dest_path: str) -> dict:
+    """Moves the completed data to `dest_path` and forgets the upload."""
+    with _lock_for(upload_id):
+        meta = _load_meta(upload_id)
+        if meta["size"] is not None and meta["offset"] != meta["size"]:
+            raise OffsetMismatch(meta["offset"])
+
+        data_path, meta_path = _paths(upload_id)
+        os.replace(data_path, dest_path)
+        os.remove(meta_path)
+    _drop_lock(upload_id)
+    return meta
+
+
+def discard_upload(upload_id: str):
+    """Deletes a partial upload; raises KeyError if there is nothing to delete."""
+    data_path, meta_path = _paths(upload_id)
+    removed = False
+    with _lock_for(upload_id):
+        for path in (data_path, meta_path):
+            try:
+                os.remove(path)
+                removed = True
+            except FileNotFoundError:
+                pass
+    _drop_lock(upload_id)
+    if not removed:
+        raise KeyError(upload_id)
+
+
+def purge_stale_uploads(ttl_seconds: int) -> int:
+    """Deletes partial uploads that have not received data within the TTL."""
+    cutoff = time.time() - ttl_seconds
+    removed = 0
+    for name in os.listdir(PARTIAL_DIR):
+        if not name.endswith(".json"):
+            continue
+        upload_id = name[:-len(".json")]
+        try:
+            data_path, meta_path = _paths(upload_id)
+        except KeyError:
+            continue
+        # The data file is touched by every chunk, the meta file only on create
+        try:
+            last_activity = max(
+                os.path.getmtime(p) for p in (data_path, meta_path) if os.path.exists(p)
+            )
+        except (OSError, ValueError):
+            continue  # Finalized or purged concurrently
+        if last_activity < cutoff:
+            try:
+                discard_upload(upload_id)
+            except KeyError:
+                continue  # Finalized or aborted concurrently
+            removed += 1
+    return removed
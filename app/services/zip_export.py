@@ -0,0 +1,210 @@
+import os
+import time
+import zlib
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Streams STORED (uncompressed) ZIP archives straight from disk. JPEGs do not
+# shrink when deflated, so nothing is recompressed. CRCs go in data
+# descriptors after each file, which makes the byte layout depend only on
+# names, sizes and mtimes: the total size is known up front and any byte
+# range can be regenerated later, so interrupted downloads can resume.
+
+CHUNK_SIZE = 256 * 1024
+ZIP64_LIMIT = 0xFFFFFFFF
+
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+DATA_DESCRIPTOR = struct.Struct("<IIII")
+CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+ZIP64_OFFSET_EXTRA = struct.Struct("<HHQ")
+ZIP64_END = struct.Struct("<IQHHIIQQQQ")
+ZIP64_LOCATOR = struct.Struct("<IIQI")
+END_OF_CENTRAL_DIR = struct.Struct("<IHHHHIIH")
+
+FLAGS = 0x08 | 0x800  # Data descriptor follows the data; UTF-8 names
+VERSION = 20
+VERSION_ZIP64 = 45
+
+# CRCs of files already streamed, so resumed downloads can skip re-reading them
+_crc_cache = OrderedDict()
+_crc_cache_lock = threading.Lock()
+CRC_CACHE_SIZE = 10000
+
+
+def _dos_datetime(mtime: float):
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (0 << 9) | (1 << 5) | 1
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+class _Entry:
+    def __init__(self, arcname: str, path: str, size: int, mtime_ns: int, offset: int):
+        self.name = arcname.encode("utf-8")
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.offset = offset
+        self.dos_time, self.dos_date = _dos_datetime(mtime_ns / 1e9)
+        self.crc = None
+
+    @property
+    def cache_key(self):
+        return (self.path, self.size, self.mtime_ns)
+
+    def local_header(self) -> bytes:
+        return LOCAL_HEADER.pack(
+            0x04034b50, VERSION, FLAGS, 0, self.dos_time, self.dos_date,
+            0, 0, 0, len(self.name), 0
+        ) + self.name
+
+    def descriptor(self) -> bytes:
+        return DATA_DESCRIPTOR.pack(0x08074b50, self.crc, self.size, self.size)
+
+    def central_header(self) -> bytes:
+        zip64 = self.offset >= ZIP64_LIMIT
+        extra = ZIP64_OFFSET_EXTRA.pack(0x0001, 8, self.offset) if zip64 else b""
+        return CENTRAL_HEADER.pack(
+            0x02014b50, VERSION_ZIP64, VERSION_ZIP64 if zip64 else VERSION, FLAGS, 0,
+            self.dos_time, self.dos_date, self.crc, self.size, self.size,
+            len(self.name), len(extra), 0, 0, 0, 0,
+            ZIP64_LIMIT if zip64 else self.offset
+        ) + self.name + extra
+
+    def central_header_size(self) -> int:
+        return CENTRAL_HEADER.size + len(self.name) + (ZIP64_OFFSET_EXTRA.size if self.offset >= ZIP64_LIMIT else 0)
+
+
+class ZipStream:
+    """
+    A STORED zip archive of `files`, given as (arcname, path) pairs.
+    Files are stat'ed once here; the archive reflects that snapshot.
+    """
+
+    def __init__(self, files):
+        self.entries = []
+        offset = 0
+        for arcname, path in files:
+            stat = os.stat(path)
+            if stat.st_size >= ZIP64_LIMIT:
+                continue  # Never the case for photos; keeps descriptors 32-bit
+            entry = _Entry(arcname, path, stat.st_size, stat.st_mtime_ns, offset)
+            self.entries.append(entry)
+            offset += LOCAL_HEADER.size + len(entry.name) + entry.size + DATA_DESCRIPTOR.size
+
+        self.cd_offset = offset
+        self.cd_size = sum(entry.central_header_size() for entry in self.entries)
+        self.zip64 = (
+            len(self.entries) >= 0xFFFF
+            or self.cd_offset >= ZIP64_LIMIT
+            or self.cd_size >= ZIP64_LIMIT
+        )
+        self.size = (
+            self.cd_offset + self.cd_size
+            + (ZIP64_END.size + ZIP64_LOCATOR.size if self.zip64 else 0)
+            + END_OF_CENTRAL_DIR.size
+        )
+
+        fingerprint = hashlib.sha1()
+        for entry in self.entries:
+            fingerprint.update(b"%s\0%d\0%d\n" % (entry.name, entry.size, entry.mtime_ns))
+        self.etag = '"' + fingerprint.hexdigest() + '"'
+
+    def _end_records(self) -> bytes:
+        count = len(self.entries)
+        records = b""
+        if self.zip64:
+            zip64_end_offset = self.cd_offset + self.cd_size
+            records += ZIP64_END.pack(
+                0x06064b50, ZIP64_END.size - 12, VERSION_ZIP64, VERSION_ZIP64, 0, 0,
+                count, count, self.cd_size, self.cd_offset
+            )
+            records += ZIP64_LOCATOR.pack(0x07064b50, 0, zip64_end_offset, 1)
+        records += END_OF_CENTRAL_DIR.pack(
+            0x06054b50, 0, 0,
+            min(count, 0xFFFF), min(count, 0xFFFF),
+            min(self.cd_size, ZIP64_LIMIT), min(self.cd_offset, ZIP64_LIMIT), 0
+        )
+        return records
+
+    def _crc(self, entry: _Entry) -> int:
+        if entry.crc is None:
+            with _crc_cache_lock:
+                entry.crc = _crc_cache.get(entry.cache_key)
+        if entry.crc is None:
+            crc = 0
+            with open(entry.path, "rb") as f:
+                while chunk := f.read(CHUNK_SIZE):
+                    crc = zlib.crc32(chunk, crc)
+            self._remember_crc(entry, crc)
+        return entry.crc
+
+    def _remember_crc(self, entry: _Entry, crc: int):
+        entry.crc = crc
+        with _crc_cache_lock:
+            _crc_cache[entry.cache_key] = crc
+            _crc_cache.move_to_end(entry.cache_key)
+            while len(_crc_cache) > CRC_CACHE_SIZE:
+                _crc_cache.popitem(last=False)
+
+    def _file_bytes(self, entry: _Entry, skip: int, length: int):
+        # Bytes [skip, skip + length) of the file; computes the CRC on full reads
+        crc = 0 if skip == 0 and length == entry.size else None
+        remaining = length
+        with open(entry.path, "rb") as f:
+            f.seek(skip)
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise IOError(f"{entry.path} changed while exporting")
+                if crc is not None:
+                    crc = zlib.crc32(chunk, crc)
+                remaining -= len(chunk)
+                yield chunk
+        if crc is not None:
+            self._remember_crc(entry, crc)
+
+    def iter_range(self, start: int = 0, end: int = None):
+        """Yields archive bytes from `start` to `end` (inclusive) in bounded chunks."""
+        end = self.size - 1 if end is None else end
+        pos = 0
+
+        def clip(data: bytes, at: int) -> bytes:
+            lo = max(start - at, 0)
+            hi = min(end - at + 1, len(data))
+            return data[lo:hi] if lo < hi else b""
+
+        for entry in self.entries:
+            if pos > end:
+                return
+            header = entry.local_header()
+            if pos + len(header) > start:
+                yield clip(header, pos)
+            pos += len(header)
+
+            if pos <= end and pos + entry.size > start:
+                skip = max(start - pos, 0)
+                length = min(end - pos + 1, entry.size) - skip
+                yield from self._file_bytes(entry, skip, length)
+            pos += entry.size
+
+            if pos <= end and pos + DATA_DESCRIPTOR.size > start:
+                self._crc(entry)
+                yield clip(entry.descriptor(), pos)
+            pos += DATA_DESCRIPTOR.size
+
+        for entry in self.entries:
+            if pos > end:
+                return
+            size = entry.central_header_size()
+            if pos + size > start:
+                self._crc(entry)
+                yield clip(entry.central_header(), pos)
+            pos += size
+
+        if pos <= end:
+            yield clip(self._end_records(), pos)
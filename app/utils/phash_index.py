@@ -0,0 +1,52 @@
+import os
+import json
+import threading
+
+# Outside app/static: entries hold booth ids (often client IPs) and capture times
+PHASH_INDEX_FILE = "app/phash_index.json"
+
+# filename -> {"booth", "captured_at", "hash", "sharpness", "posted", "collapsed", "collapsed_into", "rejected"}
+_index = None
+_lock = threading.RLock()
+
+def _load():
+    global _index
+    if _index is None:
+        if os.path.exists(PHASH_INDEX_FILE):
+            with open(PHASH_INDEX_FILE, "r") as f:
+                _index = json.load(f)
+        else:
+            _index = {}
+    return _index
+
+def _save():
+    tmp_path = PHASH_INDEX_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(_index, f)
+    os.replace(tmp_path, PHASH_INDEX_FILE)
+
+def get_entry(filename):
+    with _lock:
+        entry = _load().get(filename)
+        return dict(entry) if entry else None
+
+def all_entries():
+    with _lock:
+        return {name: dict(entry) for name, entry in _load().items()}
+
+def update_entries(updates):
+    """Merges {filename: {field: value}} into the index in one write."""
+    if not updates:
+        return
+    with _lock:
+        index = _load()
+        for filename, fields in updates.items():
+            index.setdefault(filename, {}).update(fields)
+        _save()
+
+def remove_entries(filenames):
+    with _lock:
+        index = _load()
+        removed = [index.pop(name) for name in filenames if name in index]
+        if removed:
+            _save()
@@ -0,0 +1,54 @@
+import os
+import json
+import threading
+
+POST_QUEUE_FILE = "app/static/queue.json"
+
+# Serializes every read-modify-write of the queue file (uploads + scheduler)
+queue_lock = threading.RLock()
+
+# Cached length of the queue, kept current by save_queue (None = not read yet)
+_depth = None
+
+def load_queue():
+    if not os.path.exists(POST_QUEUE_FILE):
+        return []
+    with open(POST_QUEUE_FILE, "r") as f:
+        return json.load(f)
+
+def save_queue(queue):
+    global _depth
+    # Write-then-rename so a crash never leaves a truncated queue behind
+    tmp_path = POST_QUEUE_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(queue, f, indent=4)
+    os.replace(tmp_path, POST_QUEUE_FILE)
+    _depth = len(queue)
+
+def queue_depth():
+    """
+    Number of queued posts, without re-reading the file on every call.
+    Seeded at startup, so later calls never take queue_lock.
+    """
+    global _depth
+    if _depth is None:
+        with queue_lock:
+            if _depth is None:
+                _depth = len(load_queue())
+    return _depth
+
+def append_to_queue(entries):
+    """Appends many entries in a single read-modify-write of the queue."""
+    if not entries:
+        return
+    with queue_lock:
+        queue = load_queue()
+        queue.extend(entries)
+        save_queue(queue)
+
+def remove_from_queue(*filenames):
+    with queue_lock:
+        queue = load_queue()
+        remaining = [item for item in queue if item["filename"] not in filenames]
+        if len(remaining) != len(queue):
+            save_queue(remaining)
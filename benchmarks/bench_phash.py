@@ -0,0 +1,68 @@
+"""
+Throughput of the near-duplicate fingerprint (dHash + sharpness), inline and
+on the process pool used at capture time.
+
+Run from the repository root:
+    python benchmarks/bench_phash.py --images 200 --width 1920 --height 1080
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from PIL import Image, ImageDraw
+
+from app.core.config import COMPOSITE_WORKERS
+from app.services.image_handler import fingerprint_image, get_pool, shutdown_pool
+
+
+def make_images(directory: str, count: int, size: tuple):
+    rng = random.Random(42)
+    paths = []
+    for i in range(count):
+        img = Image.new("RGB", size, (rng.randint(0, 255),) * 3)
+        draw = ImageDraw.Draw(img)
+        for _ in range(60):
+            x, y = rng.randint(0, size[0]), rng.randint(0, size[1])
+            color = (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255))
+            draw.rectangle([x, y, x + size[0] // 10, y + size[1] // 10], fill=color)
+        path = os.path.join(directory, f"{i}.jpg")
+        img.save(path, "JPEG", quality=90)
+        paths.append(path)
+    return paths
+
+
+def report(label: str, count: int, seconds: float):
+    print(f"{label:<10} {count / seconds:8.1f} images/s  ({seconds * 1000 / count:.2f} ms/image)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=100)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_images(directory, args.images, (args.width, args.height))
+        print(f"{args.images} JPEGs at {args.width}x{args.height}, pool of {COMPOSITE_WORKERS} workers")
+
+        start = time.perf_counter()
+        for path in paths:
+            fingerprint_image(path)
+        report("inline", len(paths), time.perf_counter() - start)
+
+        pool = get_pool()
+        list(pool.map(fingerprint_image, paths[:COMPOSITE_WORKERS]))  # Spawn and warm up the workers
+        start = time.perf_counter()
+        list(pool.map(fingerprint_image, paths, chunksize=4))
+        report("pool", len(paths), time.perf_counter() - start)
+        shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()